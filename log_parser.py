@@ -0,0 +1,81 @@
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+# Закрывающая кавычка поля: за ней следует ", '" (начало следующего поля) или конец строки,
+# как у разбиения по ", '"; апостроф внутри значения (Д'Артаньян) концом поля не считается
+_FIELD_END = r"(?:[ \t]*,[ \t]*'|[ \t]*\)?[ \t\r]*$)"
+
+# Значение поля без кавычек и пробелов по краям; кавычка, за которой сразу конец поля, -
+# это конец пустого значения, а не его начало
+_VALUE = (
+    r"[ \t]*(?:'(?!" + _FIELD_END + r"))?(?P<{}>[^\n]*?)[ \t\r]*"
+    r"(?:'(?=" + _FIELD_END + r")|(?=\)?[ \t\r]*$))"
+)
+
+# Формат строки: ('2024-01-31 12:00:00,000 - Client_IP: ...', 'Client_Hostname: ...', ...)
+# Выражение применяется сразу ко всему прочитанному блоку (re.M), поэтому ни одна
+# часть шаблона не выходит за пределы своей строки; поля после Client_IP необязательны
+LOG_RE = re.compile(
+    r"^[ \t]*\(?'?(?P<timestamp>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})[^-\n]*- "
+    r".*?Client_IP:" + _VALUE.format('client_ip') +
+    r"(?:.*?Client_Hostname:" + _VALUE.format('client_hostname') + ")?"
+    r"(?:.*?Server:" + _VALUE.format('server') + ")?"
+    r"(?:.*?Event:" + _VALUE.format('event') + ")?"
+    r"(?:.*?Project:" + _VALUE.format('project') + ")?"
+    r"(?:.*?Логин:" + _VALUE.format('login') + ")?"
+    r"(?:.*?Орг_уровень_5:" + _VALUE.format('org_unit') + ")?"
+    r"(?:.*?ФИО:" + _VALUE.format('fullname') + ")?",
+    re.M
+)
+
+# Начало каждой непустой строки - для подсчёта строк, не подошедших под LOG_RE
+NONBLANK_LINE_RE = re.compile(r"^[ \t\r]*\S", re.M)
+
+# Начиная с этого числа строк разбор распределяется по процессам
+PARALLEL_PARSE_MIN_LINES = 50_000
+
+# Сервер Streamlit многопоточный, поэтому fork (по умолчанию в Linux) может унести
+# в дочерний процесс чужие захваченные блокировки; рабочие процессы запускаются без fork
+PARSE_START_METHOD = (
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+
+def parse_log_buffer(text):
+    """Разбор блока строк лога в столбцы полей LOG_RE и число неразобранных строк"""
+    # finditer вместо findall: отсутствующее поле должно остаться None, а не ''
+    rows = [match.groups() for match in LOG_RE.finditer(text)]
+    if rows:
+        columns = dict(zip(LOG_RE.groupindex, zip(*rows)))
+    else:
+        columns = {field: () for field in LOG_RE.groupindex}
+    return columns, len(NONBLANK_LINE_RE.findall(text)) - len(rows)
+
+def split_by_lines(text, parts):
+    """Разбиение текста на части примерно равного размера по границам строк"""
+    bounds = [0]
+    for i in range(1, parts):
+        pos = text.find('\n', max(bounds[-1], len(text) * i // parts)) + 1
+        if not pos:
+            break
+        bounds.append(pos)
+    bounds.append(len(text))
+    return [text[lo:hi] for lo, hi in zip(bounds, bounds[1:]) if lo < hi]
+
+def parse_logs_parallel(text):
+    """Разбор большого блока логов по частям в отдельных процессах"""
+    workers = os.cpu_count() or 1
+    if workers < 2 or text.count('\n') <= PARALLEL_PARSE_MIN_LINES:
+        return parse_log_buffer(text)
+
+    context = multiprocessing.get_context(PARSE_START_METHOD)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        results = list(pool.map(parse_log_buffer, split_by_lines(text, workers)))
+
+    columns = {
+        field: tuple(chain.from_iterable(part[field] for part, _ in results))
+        for field in LOG_RE.groupindex
+    }
+    return columns, sum(errors for _, errors in results)
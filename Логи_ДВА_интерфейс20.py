@@ -1,536 +1,461 @@
-import streamlit as st
-import datetime
-import calendar
-import re
-import os
-import time
-import pandas as pd
-import altair as alt
-from collections import defaultdict
-from dateutil.relativedelta import relativedelta
-
-# Конфигурация
-LOG_FILE = 'cess_log.txt'
-
-@st.cache_data(ttl=5)
-def load_logs():
-    """Загрузка логов с отслеживанием изменений файла"""
-    try:
-        with open(LOG_FILE, 'r', encoding='utf-8') as file:
-            return [line.strip() for line in file]
-    except Exception as e:
-        st.error(f"Ошибка чтения файла: {e}")
-        return []
-
-def get_file_mtime():
-    """Получение времени последнего изменения файла"""
-    try:
-        return os.path.getmtime(LOG_FILE)
-    except FileNotFoundError:
-        return 0
-
-def check_for_updates():
-    """Проверка обновлений лог-файла"""
-    if 'last_mtime' not in st.session_state:
-        st.session_state.last_mtime = get_file_mtime()
-    
-    current_mtime = get_file_mtime()
-    if current_mtime != st.session_state.last_mtime:
-        st.session_state.last_mtime = current_mtime
-        st.cache_data.clear()
-        st.experimental_rerun()
-
-def parse_log_entry(log_line):
-    """Парсинг логов с кириллицей и сложным форматом"""
-    try:
-        line = log_line.strip().replace("('", "").replace("')", "")
-        
-        time_part, data_part = line.split(" - ", 1)
-        
-        timestamp = datetime.datetime.strptime(time_part.split(',')[0], '%Y-%m-%d %H:%M:%S')
-        
-        fields = {}
-        for item in data_part.split(", '"):
-            if ':' not in item:
-                continue
-            key, value = item.split(':', 1)
-            fields[key.strip(" '")] = value.strip().strip("'")
-        
-        return {
-            'timestamp': timestamp,
-            'client_ip': fields.get('Client_IP', 'unknown'),
-            'client_hostname': fields.get('Client_Hostname', 'unknown'),
-            'server': fields.get('Server', 'unknown'),
-            'event': fields.get('Event', 'unknown'),
-            'project': fields.get('Project', 'unknown'),
-            'login': fields.get('Логин', 'unknown'),
-            'org_unit': fields.get('Орг_уровень_5', 'unknown'),
-            'fullname': fields.get('ФИО', 'unknown')
-        }
-    except Exception as e:
-        st.error(f"Ошибка в строке: {log_line}\nПричина: {str(e)}")
-        return None
-
-@st.cache_data(ttl=5)
-def process_logs(raw_logs):
-    """Обработка сырых логов"""
-    parsed = []
-    for line in raw_logs:
-        entry = parse_log_entry(line)
-        if entry:
-            entry['date'] = entry['timestamp'].date()
-            parsed.append(entry)
-    return parsed
-
-def get_departments(logs=None):
-    return [
-        "Управление 1",
-        "Управление 2",
-        "Управление 3",
-        "Управление 4",
-        "Управление 5",
-        "Управление 6"
-    ]
-
-def assign_departments_to_logs(logs, departments):
-    for log in logs:
-        try:
-            ip = log['client_ip']
-            clean_ip = '.'.join([octet for octet in ip.split('.') if octet.isdigit()][:4])
-            last_octet = int(clean_ip.split('.')[-1]) if clean_ip.count('.') == 3 else 0
-            log['department'] = departments[last_octet % len(departments)]
-        except:
-            log['department'] = departments[0]
-    return logs
-
-def get_month_range(start, end):
-    months = []
-    current = datetime.date(start.year, start.month, 1)
-    end_date = datetime.date(end.year, end.month, 1)
-    
-    while current <= end_date:
-        months.append((current.year, current.month))
-        current += relativedelta(months=+1)
-    
-    return sorted(list(set(months)), key=lambda x: (x[0], x[1]))
-
-def prepare_chart_data(filtered_logs, start_date, end_date):
-    """Подготовка данных для графика с динамической группировкой по времени"""
-    delta = relativedelta(end_date, start_date)
-    total_months = delta.years * 12 + delta.months
-    
-    # Определение уровня группировки
-    if total_months <= 12:
-        date_format = "%Y-%m"
-        freq = 'month'
-    else:
-        date_format = "%Y"
-        freq = 'year'
-    
-    data = defaultdict(lambda: defaultdict(int))
-    departments = get_departments()
-    
-    for log in filtered_logs:
-        dept = log['department']
-        date = log['date']
-        
-        if freq == 'year':
-            period = date.strftime(date_format)
-            if date.year == end_date.year and date.month <= end_date.month:
-                period = f"{date.year}-{date.month:02d}"
-        else:
-            period = date.strftime(date_format)
-        
-        data[dept][period] += 1
-    
-    df_data = []
-    for dept in departments:
-        for period, count in data[dept].items():
-            df_data.append({
-                'Управление': dept,
-                'Период': period,
-                'Посещения': count
-            })
-    
-    return pd.DataFrame(df_data), freq
-
-def prepare_employee_data(employee_logs, start_date, end_date):
-    """Подготовка данных по сотрудникам для графика"""
-    delta = relativedelta(end_date, start_date)
-    total_months = delta.years * 12 + delta.months
-    
-    freq = 'month' if total_months <= 12 else 'year'
-    date_format = "%Y-%m" if freq == 'month' else "%Y"
-    
-    df_data = []
-    for employee, stats in employee_logs.items():
-        for (year, month), count in stats['months'].items():
-            date = datetime.date(year, month, 1)
-            period = date.strftime(date_format)
-            
-            if freq == 'year' and date.year == end_date.year and date.month <= end_date.month:
-                period = f"{year}-{month:02d}"
-                
-            df_data.append({
-                'Сотрудник': employee,
-                'Период': period,
-                'Посещения': count
-            })
-    
-    return pd.DataFrame(df_data), freq
-
-def main():
-    # Инициализация состояния
-    if 'first_run' not in st.session_state:
-        st.session_state.first_run = True
-        st.session_state.last_mtime = get_file_mtime()
-
-    # Обработка параметров URL
-    query_params = st.experimental_get_query_params()
-    
-    # Получение дат из URL или установка значений по умолчанию
-    today = datetime.date.today()
-    default_start = today - relativedelta(months=3)
-    default_end = today
-    
-    start_date = default_start
-    end_date = default_end
-    
-    if 'start_date' in query_params:
-        try:
-            start_date = datetime.date.fromisoformat(query_params['start_date'][0])
-        except:
-            pass
-    
-    if 'end_date' in query_params:
-        try:
-            end_date = datetime.date.fromisoformat(query_params['end_date'][0])
-        except:
-            pass
-
-    # Проверка обновлений
-    check_for_updates()
-
-    # Основной интерфейс
-    st.markdown(
-        "<h1 style='text-align: center; margin-bottom: 30px;'>Логи портала ДВА</h1>", 
-        unsafe_allow_html=True
-    )
-
-    # Загрузка и обработка данных
-    raw_logs = load_logs()
-    parsed_logs = process_logs(raw_logs)
-    departments = get_departments()
-    parsed_logs = assign_departments_to_logs(parsed_logs, departments)
-
-    # Секция настройки периода
-    st.sidebar.header("Настройка периода отображения")
-    try:
-        selected_range = st.sidebar.date_input(
-            "Выберите диапазон (начало и конец)",
-            value=(start_date, end_date),
-            format="YYYY/MM/DD"
-        )
-        
-        if isinstance(selected_range, (tuple, list)) and len(selected_range) == 2:
-            start_date, end_date = selected_range
-        else:
-            st.sidebar.warning("⚠️ Выберите две даты для формирования периода")
-
-    except Exception as e:
-        st.sidebar.error(f"Ошибка ввода дат: {str(e)}. Используется период по умолчанию")
-        
-    # Комментарий о периоде анализа
-    st.sidebar.markdown(
-        f"**Подсчет логов (посещений) сайта Портала ДВА ведется с " 
-        f"{start_date.strftime('%d.%m.%Y')} по {end_date.strftime('%d.%m.%Y')}**"
-    )
-    
-    # Фильтрация логов
-    filtered_logs = [log for log in parsed_logs if start_date <= log['date'] <= end_date]
-
-    # Подготовка матрицы данных для управлений
-    all_available_months = get_month_range(start_date, end_date)
-    display_months = all_available_months
-    
-    dept_matrix = {dept: {'total': 0, 'months': defaultdict(int)} for dept in departments}
-    for log in filtered_logs:
-        try:
-            dept = log['department']
-            year_month = (log['date'].year, log['date'].month)
-            dept_matrix[dept]['total'] += 1
-            dept_matrix[dept]['months'][year_month] += 1
-        except KeyError as e:
-            pass
-
-    # Стили таблицы
-    st.markdown("""
-    <style>
-        .scrollable-table {
-            max-width: 100%;
-            overflow-x: auto;
-            margin: 20px 0;
-            border: 1px solid #ddd;
-            border-radius: 5px;
-        }
-        
-        .fixed-column {
-            position: sticky;
-            left: 0;
-            background: white;
-            z-index: 1;
-            border-right: 2px solid #ddd;
-        }
-        
-        .month-header {
-            min-width: 80px;
-            text-align: center !important;
-        }
-        
-        .data-cell {
-            text-align: center;
-            vertical-align: middle !important;
-            border-left: 1px solid #ddd;
-            min-width: 80px;
-        }
-        
-        .total-column {
-            background-color: #f8f9fa;
-            font-weight: bold;
-        }
-        
-        .scrollable-table a {
-            color: #1f77b4;
-            text-decoration: none;
-            font-weight: bold;
-        }
-
-        .scrollable-table a:hover {
-            text-decoration: underline;
-            cursor: pointer;
-        }
-    </style>
-    """, unsafe_allow_html=True)
-
-        # Стили таблицы (оставить без изменений)
-    st.markdown("""
-    <style>
-        .scrollable-table {
-            max-width: 100%;
-            overflow-x: auto;
-            margin: 20px 0;
-            border: 1px solid #ddd;
-            border-radius: 5px;
-        }
-        
-        .fixed-column {
-            position: sticky;
-            left: 0;
-            background: white;
-            z-index: 1;
-            border-right: 2px solid #ddd;
-        }
-        
-        .month-header {
-            min-width: 80px;
-            text-align: center !important;
-        }
-        
-        .data-cell {
-            text-align: center;
-            vertical-align: middle !important;
-            border-left: 1px solid #ddd;
-            min-width: 80px;
-        }
-        
-        .total-column {
-            background-color: #f8f9fa;
-            font-weight: bold;
-        }
-    </style>
-    """, unsafe_allow_html=True)
-
-    # Выбор управления через selectbox
-    selected_dept = st.selectbox(
-        "Выберите управление для отображения статистики:",
-        ["Все управления"] + departments,
-        index=0
-    )
-
-    if selected_dept == "Все управления":
-        # Общая статистика по всем управлениям
-        st.markdown("### Общая статистика по управлениям")
-        
-        # Таблица
-        table_html = """
-        <div class="scrollable-table">
-            <table class="table">
-                <thead>
-                    <tr>
-                        <th class="fixed-column">Управление</th>
-                        <th class="total-column">Сумма</th>
-                        {}
-                    </tr>
-                </thead>
-                <tbody>
-                    {}
-                </tbody>
-            </table>
-        </div>
-        """.format(
-            "".join([f'<th class="month-header">{calendar.month_abbr[month]} {year}</th>' 
-                    for year, month in display_months]),
-            
-            "".join([
-                f'<tr>'
-                f'<td class="fixed-column">{dept}</td>'
-                f'<td class="total-column">{dept_matrix[dept]["total"]}</td>'
-                + "".join([f'<td class="data-cell">{dept_matrix[dept]["months"].get((year, month), 0)}</td>' 
-                          for year, month in display_months]) +
-                '</tr>'
-                for dept in departments
-            ])
-        )
-        st.markdown(table_html, unsafe_allow_html=True)
-
-        # График
-        st.markdown("---")
-        st.markdown("### График посещений по управлениям")
-        chart_df, freq = prepare_chart_data(filtered_logs, start_date, end_date)
-        
-        color_scheme = [
-            '#1f77b4', '#ff7f0e', '#2ca02c',
-            '#d62728', '#9467bd', '#8c564b'
-        ]
-        
-        line = alt.Chart(chart_df).mark_line().encode(
-            x=alt.X('Период:N', title='Период', axis=alt.Axis(labelAngle=45)),
-            y=alt.Y('Посещения:Q', title='Количество посещений'),
-            color=alt.Color('Управление:N', 
-                          scale=alt.Scale(range=color_scheme),
-                          legend=alt.Legend(
-                              title="Управления",
-                              columns=2,
-                              symbolLimit=6
-                          ))
-        )
-
-        points = alt.Chart(chart_df).mark_point(
-            filled=True,
-            size=80,
-            stroke='white',
-            strokeWidth=1,
-            opacity=0.8
-        ).encode(
-            x=alt.X('Период:N'),
-            y=alt.Y('Посещения:Q'),
-            shape=alt.Shape('Управление:N', legend=None),
-            tooltip=['Управление', 'Период', 'Посещения']
-        )
-
-        chart = (line + points).properties(
-            width=800,
-            height=400
-        ).interactive()
-
-        st.altair_chart(chart, use_container_width=True)
-
-    else:
-    # Детализированная статистика по выбранному управлению
-    st.markdown(f"### Детальная статистика по управлению: {selected_dept}")
-    
-    # Фильтрация логов
-    dept_logs = [log for log in filtered_logs 
-                if log['department'] == selected_dept]
-    
-    # Создание матрицы данных для сотрудников
-    employee_matrix = defaultdict(lambda: {'total': 0, 'months': defaultdict(int)})
-    for log in dept_logs:
-        name = log['fullname']
-        if name == 'unknown':
-            continue
-        year_month = (log['date'].year, log['date'].month)
-        employee_matrix[name]['total'] += 1
-        employee_matrix[name]['months'][year_month] += 1
-    
-    if not employee_matrix:
-        st.warning(f"В управлении '{selected_dept}' нет данных о посещениях за выбранный период")
-    else:
-        # Таблица сотрудников
-        st.markdown("#### Посещения сотрудников")
-        employee_table_html = """
-        <div class="scrollable-table">
-            <table class="table">
-                <thead>
-                    <tr>
-                        <th class="fixed-column">ФИО сотрудника</th>
-                        <th class="total-column">Сумма</th>
-                        {}
-                    </tr>
-                </thead>
-                <tbody>
-                    {}
-                </tbody>
-            </table>
-        </div>
-        """.format(
-            "".join([f'<th class="month-header">{calendar.month_abbr[month]} {year}</th>' 
-                    for year, month in display_months]),
-            
-            "".join([
-                f'<tr>'
-                f'<td class="fixed-column">{name}</td>'
-                f'<td class="total-column">{stats["total"]}</td>'
-                + "".join([f'<td class="data-cell">{stats["months"].get((year, month), 0)}</td>' 
-                          for year, month in display_months]) +
-                '</tr>'
-                for name, stats in employee_matrix.items()
-            ])
-        )
-        st.markdown(employee_table_html, unsafe_allow_html=True)
-        
-        # График для сотрудников
-        st.markdown("---")
-        st.markdown("#### График посещений сотрудников")
-        chart_df, freq = prepare_employee_data(employee_matrix, start_date, end_date)
-        
-        if not chart_df.empty:
-            line = alt.Chart(chart_df).mark_line().encode(
-                x=alt.X('Период:N', title='Период', axis=alt.Axis(labelAngle=45)),
-                y=alt.Y('Посещения:Q', title='Количество посещений'),
-                color=alt.Color('Сотрудник:N', legend=alt.Legend(title="Сотрудники")),
-                tooltip=[
-                    alt.Tooltip('Сотрудник:N', title="Сотрудник"),
-                    alt.Tooltip('Период:T', title="Период"),
-                    alt.Tooltip('Посещения:Q', title="Посещения")
-                ]
-            )
-
-            points = alt.Chart(chart_df).mark_point(
-                filled=True,
-                size=80,
-                stroke='white',
-                strokeWidth=1,
-                opacity=0.8
-            ).encode(
-                x=alt.X('Период:N'),
-                y=alt.Y('Посещения:Q'),
-                shape=alt.Shape('Сотрудник:N', legend=None),
-                tooltip=[
-                    alt.Tooltip('Сотрудник:N', title="Сотрудник"),
-                    alt.Tooltip('Период:T', title="Период"),
-                    alt.Tooltip('Посещения:Q', title="Посещения")
-                ]
-            )
-
-            chart = (line + points).properties(
-                width=800,
-                height=400
-            ).interactive()
-
-            st.altair_chart(chart, use_container_width=True)
-        else:
-            st.info("Недостаточно данных для построения графика")
-
-if __name__ == "__main__":
+import streamlit as st
+import datetime
+import calendar
+import re
+import os
+import time
+import threading
+import numpy as np
+import pandas as pd
+import altair as alt
+from functools import lru_cache
+from dateutil.relativedelta import relativedelta
+from log_parser import parse_logs_parallel
+
+# Конфигурация
+LOG_FILE = 'cess_log.txt'
+
+# Сокращённые названия месяцев (индекс 0 - пустая строка, как в calendar.month_abbr)
+MONTH_ABBR = tuple(calendar.month_abbr)
+
+# Минимальный интервал между проверками обновлений лог-файла, секунд
+UPDATE_CHECK_INTERVAL = 2
+
+@st.cache_resource
+def get_log_state(path):
+    """Общее для всех сессий состояние загрузки лога: смещение, подпись файла, DataFrame и ошибки"""
+    return {
+        'lock': threading.Lock(),
+        'offset': 0,
+        'signature': None,
+        'logs': process_logs('')[0],
+        'parse_errors': 0,
+        'read_error': None
+    }
+
+def load_logs_incremental(path, mtime, size):
+    """Инкрементальная загрузка логов: DataFrame, число неразобранных строк и ошибка чтения"""
+    state = get_log_state(path)
+    signature = (mtime, size)
+
+    # Пока одна сессия дочитывает файл, остальные ждут и получают готовый результат
+    with state['lock']:
+        if signature != state['signature']:
+            update_log_state(state, path, signature)
+
+        # Ошибки хранятся в общем состоянии и показываются каждой сессии, а не только той,
+        # что дочитала файл
+        return state['logs'], state['parse_errors'], state['read_error']
+
+def update_log_state(state, path, signature):
+    """Дочитывание новых строк лога в общее состояние (вызывается под его блокировкой)"""
+    size = signature[1]
+    try:
+        # Файл стал короче сохранённого смещения - усечение или ротация, читаем заново
+        if size < state['offset']:
+            state['offset'] = 0
+            state['logs'] = process_logs('')[0]
+            state['parse_errors'] = 0
+
+        new_logs, errors, end = read_log_chunk(path, state['offset'], size)
+    except Exception as e:
+        state['read_error'] = str(e)
+        return
+
+    state['read_error'] = None
+
+    if end:
+        logs = pd.concat([state['logs'], new_logs], ignore_index=True)
+
+        # Подсчёт по месяцам опирается на хронологический порядок строк
+        if not logs['timestamp'].is_monotonic_increasing:
+            logs = logs.sort_values('timestamp', kind='stable', ignore_index=True)
+
+        state['logs'] = logs
+        state['parse_errors'] += errors
+        state['offset'] += end
+
+    state['signature'] = signature
+
+def read_log_chunk(path, offset, size):
+    """Чтение и разбор байтов лога от offset до последней полной строки в пределах size"""
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        chunk = file.read(size - offset)
+
+    # Недописанная последняя строка будет прочитана при следующем обновлении
+    end = chunk.rfind(b'\n') + 1
+    logs, errors = process_logs(chunk[:end].decode('utf-8'))
+    return logs, errors, end
+
+def get_file_mtime():
+    """Получение времени последнего изменения файла"""
+    try:
+        return os.path.getmtime(LOG_FILE)
+    except FileNotFoundError:
+        return 0
+
+def get_file_size():
+    """Получение размера лог-файла в байтах"""
+    try:
+        return os.path.getsize(LOG_FILE)
+    except FileNotFoundError:
+        return 0
+
+def get_file_signature():
+    """Подпись лог-файла: время последнего изменения и размер"""
+    return get_file_mtime(), get_file_size()
+
+def check_for_updates():
+    """Проверка обновлений лог-файла не чаще раза в UPDATE_CHECK_INTERVAL секунд"""
+    if 'last_sig' not in st.session_state:
+        st.session_state.last_sig = get_file_signature()
+
+    now = time.monotonic()
+    last_check = st.session_state.get('last_update_check')
+    if last_check is not None and now - last_check < UPDATE_CHECK_INTERVAL:
+        return
+    st.session_state.last_update_check = now
+
+    # Файл, у которого изменилось только время (touch) или только размер, не перечитывается
+    mtime, size = get_file_signature()
+    last_mtime, last_size = st.session_state.last_sig
+    if mtime != last_mtime and size != last_size:
+        st.session_state.last_sig = (mtime, size)
+        st.experimental_rerun()
+
+def process_logs(text):
+    """Обработка блока сырых логов в DataFrame и число неразобранных строк"""
+    columns, errors = parse_logs_parallel(text)
+
+    # Метка времени в формате ISO, поэтому NumPy разбирает весь столбец за один вызов
+    try:
+        timestamps = np.array(columns['timestamp'], dtype='datetime64[s]')
+    except ValueError:
+        # В блоке есть несуществующая дата - такие строки отбрасываются ниже
+        timestamps = pd.to_datetime(
+            list(columns['timestamp']), format='%Y-%m-%d %H:%M:%S', errors='coerce'
+        ).to_numpy(dtype='datetime64[s]')
+
+    logs = pd.DataFrame(
+        {field: np.array(values, dtype=object) for field, values in columns.items()}
+    ).fillna('unknown')
+    logs['timestamp'] = timestamps
+    logs['date'] = timestamps.astype('datetime64[D]')
+
+    valid = ~np.isnat(timestamps)
+    if not valid.all():
+        errors += int((~valid).sum())
+        logs = logs[valid].reset_index(drop=True)
+
+    # Управление вычисляется один раз на уникальный IP и раздаётся по строкам;
+    # категориальный столбец хранит вместо строки однобайтовый код
+    departments = get_departments()
+    ip_to_dept = {ip: _ip_to_dept(ip) for ip in logs['client_ip'].unique()}
+    logs['department'] = pd.Categorical(
+        logs['client_ip'].map(ip_to_dept).fillna(departments[0]), categories=departments
+    )
+    return logs, errors
+
+def get_departments(logs=None):
+    return [
+        "Управление 1",
+        "Управление 2",
+        "Управление 3",
+        "Управление 4",
+        "Управление 5",
+        "Управление 6"
+    ]
+
+@lru_cache(maxsize=4096)
+def _ip_to_dept(ip):
+    """Управление по последнему числу в IP-адресе (адрес без чисел - первое управление)"""
+    departments = get_departments()
+    match = re.search(r'\d+(?!.*\d)', ip)
+    last_octet = int(match.group()) if match else 0
+    return departments[last_octet % len(departments)]
+
+def get_month_range(start, end):
+    # Месяцы нумеруются как year * 12 + (month - 1), диапазон уже упорядочен и без повторов
+    start_idx = start.year * 12 + start.month - 1
+    end_idx = end.year * 12 + end.month - 1
+    return [(idx // 12, idx % 12 + 1) for idx in range(start_idx, end_idx + 1)]
+
+def get_month_columns(display_months):
+    """Месяцы отображения как метки datetime64[M] для столбцов сводных таблиц"""
+    return np.array([f"{year}-{month:02d}" for year, month in display_months], dtype='datetime64[M]')
+
+def count_visits_by_month(logs, key, month_columns):
+    """Сводная таблица посещений: строки - значения столбца key, столбцы - месяцы"""
+    codes, labels = pd.factorize(logs[key], sort=True)
+    matrix = pd.DataFrame(
+        0, index=pd.Index(np.asarray(labels), name=key), columns=month_columns, dtype=np.int64
+    )
+    n_months = len(month_columns)
+    if not n_months:
+        return matrix
+
+    dates = logs['date'].to_numpy()
+    month_bounds = np.append(month_columns, month_columns[-1] + 1).astype(dates.dtype)
+    indptr = np.searchsorted(dates, month_bounds)
+    month_idx = np.repeat(np.arange(n_months), np.diff(indptr))
+    group_key = codes[indptr[0]:indptr[-1]] * n_months + month_idx
+    matrix[:] = np.bincount(group_key, minlength=len(labels) * n_months).reshape(len(labels), n_months)
+    return matrix
+
+@lru_cache(maxsize=32)
+def get_month_labels(display_months):
+    """Подписи столбцов месяцев ('Jan 2024', ...), общие для обеих таблиц и повторных запусков"""
+    return tuple(f"{MONTH_ABBR[month]} {year}" for year, month in display_months)
+
+def show_visits_table(matrix, label, display_months):
+    """Таблица посещений: название, сумма за период и посещения по месяцам"""
+    table = matrix.set_axis(list(get_month_labels(tuple(display_months))), axis=1)
+    table.insert(0, 'Сумма', matrix.sum(axis=1).to_numpy())
+    table = table.rename_axis(label).reset_index()
+    st.dataframe(
+        table,
+        use_container_width=True,
+        hide_index=True,
+        column_config={label: st.column_config.Column(pinned=True)}
+    )
+
+def matrix_to_chart_data(matrix, label, start_date, end_date):
+    """Перевод сводной таблицы по месяцам в длинный формат для графика с группировкой по времени"""
+    delta = relativedelta(end_date, start_date)
+    total_months = delta.years * 12 + delta.months
+
+    # Определение уровня группировки: месяцы последнего года показываются отдельно
+    freq = 'month' if total_months <= 12 else 'year'
+    months = matrix.columns.to_numpy().astype('datetime64[M]')
+    periods = months.astype(str)
+    if freq == 'year':
+        years = months.astype('datetime64[Y]')
+        last_year = (years == np.datetime64(end_date, 'Y')) & (months <= np.datetime64(end_date, 'M'))
+        periods = np.where(last_year, periods, years.astype(str))
+
+    # Месяцы упорядочены, поэтому месяцы одного периода идут подряд
+    # и суммируются одним np.add.reduceat по столбцам матрицы
+    values = matrix.to_numpy()
+    if len(periods):
+        starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+        values, periods = np.add.reduceat(values, starts, axis=1), periods[starts]
+
+    counts = pd.DataFrame(values, index=matrix.index, columns=periods).stack()
+    counts = counts[counts > 0].rename_axis([label, 'Период']).reset_index(name='Посещения')
+    return counts, freq
+
+def prepare_chart_data(dept_matrix, start_date, end_date):
+    """Подготовка данных для графика с динамической группировкой по времени"""
+    return matrix_to_chart_data(dept_matrix, 'Управление', start_date, end_date)
+
+def prepare_employee_data(employee_matrix, start_date, end_date):
+    """Подготовка данных по сотрудникам для графика"""
+    return matrix_to_chart_data(employee_matrix, 'Сотрудник', start_date, end_date)
+
+def main():
+    # Инициализация состояния
+    if 'first_run' not in st.session_state:
+        st.session_state.first_run = True
+        st.session_state.last_sig = get_file_signature()
+
+    # Обработка параметров URL
+    query_params = st.experimental_get_query_params()
+    
+    # Получение дат из URL или установка значений по умолчанию
+    today = datetime.date.today()
+    default_start = today - relativedelta(months=3)
+    default_end = today
+    
+    start_date = default_start
+    end_date = default_end
+    
+    if 'start_date' in query_params:
+        try:
+            start_date = datetime.date.fromisoformat(query_params['start_date'][0])
+        except:
+            pass
+    
+    if 'end_date' in query_params:
+        try:
+            end_date = datetime.date.fromisoformat(query_params['end_date'][0])
+        except:
+            pass
+
+    # Проверка обновлений
+    check_for_updates()
+
+    # Основной интерфейс
+    st.markdown(
+        "<h1 style='text-align: center; margin-bottom: 30px;'>Логи портала ДВА</h1>", 
+        unsafe_allow_html=True
+    )
+
+    # Загрузка и обработка данных
+    parsed_logs, parse_errors, read_error = load_logs_incremental(LOG_FILE, *get_file_signature())
+    if read_error:
+        st.error(f"Ошибка чтения файла: {read_error}")
+    if parse_errors:
+        st.error(f"Не удалось разобрать строк: {parse_errors}")
+    departments = get_departments()
+
+    # Секция настройки периода
+    st.sidebar.header("Настройка периода отображения")
+    try:
+        selected_range = st.sidebar.date_input(
+            "Выберите диапазон (начало и конец)",
+            value=(start_date, end_date),
+            format="YYYY/MM/DD"
+        )
+        
+        if isinstance(selected_range, (tuple, list)) and len(selected_range) == 2:
+            start_date, end_date = selected_range
+        else:
+            st.sidebar.warning("⚠️ Выберите две даты для формирования периода")
+
+    except Exception as e:
+        st.sidebar.error(f"Ошибка ввода дат: {str(e)}. Используется период по умолчанию")
+        
+    # Комментарий о периоде анализа
+    st.sidebar.markdown(
+        f"**Подсчет логов (посещений) сайта Портала ДВА ведется с " 
+        f"{start_date.strftime('%d.%m.%Y')} по {end_date.strftime('%d.%m.%Y')}**"
+    )
+    
+    # Фильтрация логов: даты упорядочены, поэтому границы окна находятся двоичным
+    # поиском, а копируются только столбцы, нужные для сводных таблиц и графиков
+    dates = parsed_logs['date'].to_numpy()
+    lo = np.searchsorted(dates, np.datetime64(start_date).astype(dates.dtype), side='left')
+    hi = np.searchsorted(dates, np.datetime64(end_date).astype(dates.dtype), side='right')
+    filtered_logs = parsed_logs.iloc[lo:hi][['date', 'department', 'fullname']]
+
+    # Подготовка матрицы данных для управлений
+    all_available_months = get_month_range(start_date, end_date)
+    display_months = all_available_months
+    
+    month_columns = get_month_columns(display_months)
+    dept_matrix = count_visits_by_month(filtered_logs, 'department', month_columns).reindex(
+        index=departments, fill_value=0
+    )
+
+    # Выбор управления через selectbox
+    selected_dept = st.selectbox(
+        "Выберите управление для отображения статистики:",
+        ["Все управления"] + departments,
+        index=0
+    )
+
+    if selected_dept == "Все управления":
+        # Общая статистика по всем управлениям
+        st.markdown("### Общая статистика по управлениям")
+        
+        # Таблица
+        show_visits_table(dept_matrix, 'Управление', display_months)
+
+        # График
+        st.markdown("---")
+        st.markdown("### График посещений по управлениям")
+        chart_df, freq = prepare_chart_data(dept_matrix, start_date, end_date)
+        
+        color_scheme = [
+            '#1f77b4', '#ff7f0e', '#2ca02c',
+            '#d62728', '#9467bd', '#8c564b'
+        ]
+        
+        line = alt.Chart(chart_df).mark_line().encode(
+            x=alt.X('Период:N', title='Период', axis=alt.Axis(labelAngle=45)),
+            y=alt.Y('Посещения:Q', title='Количество посещений'),
+            color=alt.Color('Управление:N', 
+                          scale=alt.Scale(range=color_scheme),
+                          legend=alt.Legend(
+                              title="Управления",
+                              columns=2,
+                              symbolLimit=6
+                          ))
+        )
+
+        points = alt.Chart(chart_df).mark_point(
+            filled=True,
+            size=80,
+            stroke='white',
+            strokeWidth=1,
+            opacity=0.8
+        ).encode(
+            x=alt.X('Период:N'),
+            y=alt.Y('Посещения:Q'),
+            shape=alt.Shape('Управление:N', legend=None),
+            tooltip=['Управление', 'Период', 'Посещения']
+        )
+
+        chart = (line + points).properties(
+            width=800,
+            height=400
+        ).interactive()
+
+        st.altair_chart(chart, use_container_width=True)
+
+    else:
+        # Детализированная статистика по выбранному управлению
+        st.markdown(f"### Детальная статистика по управлению: {selected_dept}")
+        
+        # Фильтрация логов
+        dept_logs = filtered_logs[
+            (filtered_logs['department'] == selected_dept) &
+            (filtered_logs['fullname'] != 'unknown')
+        ]
+        
+        # Создание матрицы данных для сотрудников
+        employee_matrix = count_visits_by_month(dept_logs, 'fullname', month_columns)
+        
+        if employee_matrix.empty:
+            st.warning(f"В управлении '{selected_dept}' нет данных о посещениях за выбранный период")
+        else:
+            # Таблица сотрудников
+            st.markdown("#### Посещения сотрудников")
+            show_visits_table(employee_matrix, 'ФИО сотрудника', display_months)
+            
+            # График для сотрудников
+            st.markdown("---")
+            st.markdown("#### График посещений сотрудников")
+            chart_df, freq = prepare_employee_data(employee_matrix, start_date, end_date)
+            
+            if not chart_df.empty:
+                line = alt.Chart(chart_df).mark_line().encode(
+                    x=alt.X('Период:N', title='Период', axis=alt.Axis(labelAngle=45)),
+                    y=alt.Y('Посещения:Q', title='Количество посещений'),
+                    color=alt.Color('Сотрудник:N', legend=alt.Legend(title="Сотрудники")),
+                    tooltip=[
+                        alt.Tooltip('Сотрудник:N', title="Сотрудник"),
+                        alt.Tooltip('Период:T', title="Период"),
+                        alt.Tooltip('Посещения:Q', title="Посещения")
+                    ]
+                )
+    
+                points = alt.Chart(chart_df).mark_point(
+                    filled=True,
+                    size=80,
+                    stroke='white',
+                    strokeWidth=1,
+                    opacity=0.8
+                ).encode(
+                    x=alt.X('Период:N'),
+                    y=alt.Y('Посещения:Q'),
+                    shape=alt.Shape('Сотрудник:N', legend=None),
+                    tooltip=[
+                        alt.Tooltip('Сотрудник:N', title="Сотрудник"),
+                        alt.Tooltip('Период:T', title="Период"),
+                        alt.Tooltip('Посещения:Q', title="Посещения")
+                    ]
+                )
+    
+                chart = (line + points).properties(
+                    width=800,
+                    height=400
+                ).interactive()
+    
+                st.altair_chart(chart, use_container_width=True)
+            else:
+                st.info("Недостаточно данных для построения графика")
+
+if __name__ == "__main__":
     main()
\ No newline at end of file